@@ -8,6 +8,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime, timedelta
+import math
 import os
 from dotenv import load_dotenv
 from firebolt.db import connect
@@ -24,6 +25,29 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Cap on customer markers per map trace, sampled server-side. Once the matching
+# orders (counted in Firebolt) outnumber what the traces can draw, i.e. this cap
+# times the number of stores or zones, the map switches to a density layer of
+# binned order totals, since the markers would no longer show every order
+MAX_POINTS_PER_TRACE = 300
+
+# Decimal places of the lat/lon grid the density layer is aggregated on (~100 m)
+DENSITY_GRID_DECIMALS = 3
+
+# Rows fetched per round trip when reading query results
+FETCH_BATCH_SIZE = 10000
+
+# Distance bucket edges (km) and marker sizes, nearest bucket largest
+DISTANCE_BINS = np.array([1, 2, 5, 10])
+DISTANCE_SIZES = np.array([10, 8, 6, 5, 4])
+
+# Unit circle used to draw coverage areas, computed once at import
+CIRCLE_ANGLES = np.linspace(0, 2 * np.pi, 32)
+CIRCLE_SIN, CIRCLE_COS = np.sin(CIRCLE_ANGLES), np.cos(CIRCLE_ANGLES)
+
+# Coordinate columns sent to the maps
+COORD_COLUMNS = ('customer_lat', 'customer_lon', 'store_lat', 'store_lon', 'center_lat', 'center_lon')
+
 @st.cache_resource
 def get_connection():
     """Get Firebolt database connection"""
@@ -46,37 +70,144 @@ def get_connection():
         st.info("Please check your .env file with Firebolt credentials")
         return None
 
-def run_query(query):
+def execute_query(query, params=None):
+    """Execute a query with optional `?` parameters and return results as DataFrame"""
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    # A cursor per call from the shared connection, so sessions don't queue on one cursor
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        columns = [desc[0] for desc in cursor.description]
+
+        # Stream rows in batches into per-column buffers instead of
+        # materializing the full row list first
+        column_data = [[] for _ in columns]
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            for col, values in zip(column_data, zip(*batch)):
+                col.extend(values)
+
+    # Build the frame column-wise rather than through the row-oriented constructor
+    return pd.DataFrame({name: np.asarray(col) for name, col in zip(columns, column_data)})
+
+def run_query(query, params=None):
     """Execute a query and return results as DataFrame"""
     try:
-        conn = get_connection()
-        if not conn:
-            return pd.DataFrame()
-        
-        with conn.cursor() as cursor:
-            cursor.execute(query)
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            
-        return pd.DataFrame(results, columns=columns)
-    
+        return execute_query(query, params)
+
     except Exception as e:
         st.error(f"Query execution failed: {str(e)}")
         return pd.DataFrame()
 
+def run_cached(fetch, *args):
+    """Call a cached fetch function, reporting failures rather than caching them"""
+    try:
+        return fetch(*args)
+
+    except Exception as e:
+        st.error(f"Query execution failed: {str(e)}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def execute_query_cached(query, params=()):
+    """Cached execute_query, keyed on the query text and its parameters"""
+    return execute_query(query, params or None)
+
+def run_query_cached(query, params=()):
+    """Execute a parameterized query, reusing results for identical inputs"""
+    return run_cached(execute_query_cached, query, tuple(params))
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_stores():
+    """Get available stores and their coordinates"""
+    return execute_query("""
+    SELECT store_id, ANY_VALUE(store_lat) as store_lat, ANY_VALUE(store_lon) as store_lon
+    FROM customer_orders
+    GROUP BY store_id
+    ORDER BY store_id
+    """)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_zones():
+    """Get available geographic zones and their centers"""
+    return execute_query("""
+    SELECT 
+        zone_id,
+        zone_name,
+        zone_type,
+        zone_lat as center_lat,
+        zone_lon as center_lon,
+        zone_radius,
+        polygon_wkt
+    FROM geo_zones 
+    ORDER BY zone_name
+    """)
+
+def load_stores():
+    """Stores lookup, fetched once and reused across reruns"""
+    return run_cached(fetch_stores)
+
+def load_zones():
+    """Zones lookup, fetched once and reused across reruns"""
+    return compact_coordinates(run_cached(fetch_zones))
+
+def compact_coordinates(df):
+    """Round coordinate columns to 5 decimals (~1 m) for shorter map payloads"""
+    for col in COORD_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('float64').round(5)
+    return df
+
+def order_density_trace(df, name):
+    """Heatmap layer of customer orders weighted by order value"""
+    return go.Densitymap(
+        lat=df['customer_lat'],
+        lon=df['customer_lon'],
+        z=df['order_value'],
+        radius=12,
+        name=name,
+        showscale=False
+    )
+
+def distance_sizes(distances):
+    """Marker sizes for distances in km, bucketed by DISTANCE_BINS"""
+    return DISTANCE_SIZES[np.digitize(np.asarray(distances), DISTANCE_BINS)]
+
+def coverage_hover_text(df):
+    """Hover labels of order value and distance, formatted column-wise"""
+    return (
+        "$" + df['order_value'].round(0).astype(int).astype(str)
+        + "<br>" + df['distance_km'].astype(str) + " km"
+    ).to_numpy()
+
+def polygon_ring(polygon_wkt):
+    """Return the (lats, lons) of a WKT polygon's outer ring"""
+    ring = polygon_wkt[polygon_wkt.index('((') + 2:].split(')')[0]
+    lons, lats = zip(*(map(float, point.split()) for point in ring.split(',')))
+    return list(lats), list(lons)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_sample_counts():
+    """Row counts of the demo tables"""
+    return execute_query("""
+    SELECT
+        (SELECT COUNT(*) FROM customer_orders) as orders,
+        (SELECT COUNT(*) FROM geo_zones) as zones
+    """)
+
 def check_sample_data():
     """Check if sample data exists in the database"""
-    try:
-        orders_df = run_query("SELECT COUNT(*) as count FROM customer_orders")
-        zones_df = run_query("SELECT COUNT(*) as count FROM geo_zones")
-        
-        orders_count = orders_df.iloc[0]['count'] if not orders_df.empty else 0
-        zones_count = zones_df.iloc[0]['count'] if not zones_df.empty else 0
-        
-        return orders_count, zones_count
-    except:
+    counts_df = run_cached(fetch_sample_counts)
+
+    if counts_df.empty:
         return 0, 0
 
+    return int(counts_df.iloc[0]['orders']), int(counts_df.iloc[0]['zones'])
+
 def show_data_setup():
     """Show data setup instructions"""
     st.warning("⚠️ No sample data found in your database!")
@@ -121,7 +252,8 @@ def show_data_setup():
             zone_type TEXT,
             zone_lat DOUBLE PRECISION,
             zone_lon DOUBLE PRECISION,
-            zone_radius DOUBLE PRECISION
+            zone_radius DOUBLE PRECISION,
+            polygon_wkt TEXT
         );
         """, language="sql")
 
@@ -165,6 +297,79 @@ def main():
     # Run selected demo
     demo_functions[demo_choice]()
 
+@st.cache_data(ttl=300, show_spinner=False)
+def build_distance_figure(results_df, density_df, selected_stores, max_distance):
+    """Distance map of sampled orders around the selected stores, memoized on its inputs"""
+    fig = go.Figure()
+    
+    # Color palette for stores
+    colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown', 'pink']
+    
+    # Dense result sets render as a heatmap of all matching orders rather than
+    # overlapping markers
+    use_density = density_df is not None and not density_df.empty
+    if use_density:
+        fig.add_trace(order_density_trace(density_df, 'Order Density'))
+    
+    # Keep each store's color tied to its position in the selection
+    store_colors = {
+        store_id: colors[i % len(colors)]
+        for i, store_id in enumerate(selected_stores)
+    }
+    
+    # Add customer orders with color-coding by store (one pass over the results)
+    store_groups = results_df.groupby('store_id', sort=False)
+    if not use_density:
+        for store_id, store_orders in store_groups:
+            fig.add_trace(go.Scattermap(
+                lat=store_orders['customer_lat'],
+                lon=store_orders['customer_lon'],
+                mode='markers',
+                marker=dict(size=8, color=store_colors[store_id], opacity=0.7),
+                customdata=store_orders[['order_value', 'distance_km', 'delivery_time_minutes']].to_numpy(),
+                name=f'Store {store_id} Orders ({len(store_orders)})',
+                hovertemplate="<b>Order: $%{customdata[0]:.0f}<br>"
+                              "Distance: %{customdata[1]:.2f} km<br>"
+                              "Delivery: %{customdata[2]:.0f} min<br>"
+                              "Store: " + store_id + "</b><br>"
+                              "Lat: %{lat}<br>Lon: %{lon}<extra></extra>"
+            ))
+    
+    # Add all store locations as a single trace
+    store_points = store_groups[['store_lat', 'store_lon']].first()
+    fig.add_trace(go.Scattermap(
+        lat=store_points['store_lat'],
+        lon=store_points['store_lon'],
+        mode='markers',
+        marker=dict(
+            size=25,
+            color=[store_colors[store_id] for store_id in store_points.index],
+            symbol='building',
+            opacity=0.9
+        ),
+        text=[
+            f"🏪 Store: {store_id}<br>Location: {lat:.4f}, {lon:.4f}"
+            for store_id, lat, lon in zip(store_points.index, store_points['store_lat'], store_points['store_lon'])
+        ],
+        name='🏪 Stores',
+        hovertemplate="<b>%{text}</b><extra></extra>"
+    ))
+    
+    # Center map on stores
+    center_lat = results_df['store_lat'].mean()
+    center_lon = results_df['store_lon'].mean()
+    
+    fig.update_layout(
+        map=dict(
+            style="open-street-map",
+            center=dict(lat=center_lat, lon=center_lon),
+            zoom=10
+        ),
+        title=f"ST_Distance Analysis: Orders within {max_distance}km of Stores",
+        height=600
+    )
+    return fig
+
 def show_st_distance_demo():
     """Store Coverage Analysis: Distance-based customer reach optimization"""
     st.header("1. Store Coverage Analysis")
@@ -184,12 +389,7 @@ def show_st_distance_demo():
     
     with col2:
         # Get available stores
-        stores_query = """
-        SELECT DISTINCT store_id, store_lat, store_lon
-        FROM customer_orders
-        ORDER BY store_id
-        """
-        stores_df = run_query(stores_query)
+        stores_df = load_stores()
         
         if stores_df.empty:
             st.warning("No store data available")
@@ -216,196 +416,190 @@ def show_st_distance_demo():
         st.metric("Min Order Value", f"${min_order_value}")
     
     with col1:
-        # Build store-to-customer distance query
-        store_ids_str = "', '".join(selected_stores)
-        
-        # Get balanced sample from all selected stores (not just first store due to LIMIT)
-        distance_query = f"""
-        WITH ranked_orders AS (
-            SELECT 
-                order_id,
+        # Bind the selected stores as a single sorted array parameter so the
+        # query text stays the same for every selection and ordering
+        store_ids = sorted(selected_stores)
+
+        # Bounding box half-width in degrees (~111.32 km per degree of latitude)
+        # lets Firebolt prune by range before evaluating the Haversine formula
+        bbox_deg = round(max_distance / 111.32, 6)
+
+        # Compute distances with the Haversine formula in Firebolt, keeping only
+        # orders within range; shared by the map points and summary queries
+        distance_ctes = """
+        WITH stores AS (
+            SELECT
                 store_id,
-                customer_lat,
-                customer_lon,
-                order_value,
-                delivery_time_minutes,
-                (SELECT store_lat FROM customer_orders c2 WHERE c2.store_id = customer_orders.store_id LIMIT 1) as store_lat,
-                (SELECT store_lon FROM customer_orders c2 WHERE c2.store_id = customer_orders.store_id LIMIT 1) as store_lon,
-                ROW_NUMBER() OVER (PARTITION BY store_id ORDER BY order_value DESC) as rn
-            FROM customer_orders 
-            WHERE store_id IN ('{store_ids_str}')
-            AND order_value >= {min_order_value}
+                MIN(store_lat) as store_lat,
+                MIN(store_lon) as store_lon
+            FROM customer_orders
+            WHERE CONTAINS(?, store_id)
+            GROUP BY store_id
+        ),
+        store_orders AS (
+            SELECT
+                co.order_id,
+                co.store_id,
+                co.customer_lat,
+                co.customer_lon,
+                co.order_value,
+                co.delivery_time_minutes,
+                s.store_lat,
+                s.store_lon
+            FROM customer_orders co
+            JOIN stores s ON co.store_id = s.store_id
+            WHERE co.order_value >= ?
+        ),
+        order_distances AS (
+            SELECT 
+                *,
+                ROUND(2 * 6371 * ASIN(SQRT(
+                    POW(SIN(RADIANS(customer_lat - store_lat) / 2), 2) +
+                    COS(RADIANS(customer_lat)) * COS(RADIANS(store_lat)) *
+                    POW(SIN(RADIANS(customer_lon - store_lon) / 2), 2)
+                )), 2) as distance_km
+            FROM store_orders
+            WHERE customer_lat BETWEEN store_lat - ? AND store_lat + ?
+            AND customer_lon BETWEEN store_lon - ? / COS(RADIANS(store_lat))
+                                 AND store_lon + ? / COS(RADIANS(store_lat))
+        ),
+        nearby_orders AS (
+            SELECT * FROM order_distances
+            WHERE distance_km <= ?
         )
-        SELECT * FROM ranked_orders 
-        WHERE rn <= 250  -- Max 250 orders per store for better performance
-        ORDER BY store_id, order_value DESC
         """
+        distance_params = (
+            (store_ids, min_order_value)
+            + (bbox_deg,) * 4
+            + (max_distance,)
+        )
+
+        # Balanced sample of orders per store for the map and charts; hashing
+        # order_id gives a stable, representative sample of each store
+        distance_query = distance_ctes + """
+        , ranked_orders AS (
+            SELECT
+                *,
+                ROW_NUMBER() OVER (PARTITION BY store_id ORDER BY HASH(order_id)) as rn
+            FROM nearby_orders
+        )
+        SELECT * FROM ranked_orders
+        WHERE rn <= ?  -- Cap orders per store for better performance
+        ORDER BY store_id, distance_km
+        """
+
+        # Per-store metrics aggregated in Firebolt over all orders within range
+        summary_query = distance_ctes + """
+        SELECT
+            store_id,
+            COUNT(*) as order_count,
+            SUM(order_value) as total_revenue,
+            AVG(order_value) as avg_order_value,
+            AVG(distance_km) as avg_distance,
+            MIN(distance_km) as min_distance,
+            MAX(distance_km) as max_distance,
+            AVG(delivery_time_minutes) as avg_delivery_time
+        FROM nearby_orders
+        GROUP BY store_id
+        ORDER BY store_id
+        """
+
+        # Order value totals on a coarse lat/lon grid over all orders within range
+        density_query = distance_ctes + f"""
+        SELECT
+            ROUND(customer_lat, {DENSITY_GRID_DECIMALS}) as customer_lat,
+            ROUND(customer_lon, {DENSITY_GRID_DECIMALS}) as customer_lon,
+            SUM(order_value) as order_value
+        FROM nearby_orders
+        GROUP BY ROUND(customer_lat, {DENSITY_GRID_DECIMALS}), ROUND(customer_lon, {DENSITY_GRID_DECIMALS})
+        """
+
+        results_df = compact_coordinates(run_query_cached(distance_query, distance_params + (MAX_POINTS_PER_TRACE,)))
+        summary_df = run_query_cached(summary_query, distance_params)
         
-        results_df = run_query(distance_query)
-        
-        if not results_df.empty:
-            # Calculate distances using Haversine formula (since ST_Distance has issues)
-            from math import radians, sin, cos, sqrt, atan2
+        if not results_df.empty and not summary_df.empty:
+            total_orders = int(summary_df['order_count'].sum())
             
-            def haversine_distance(lat1, lon1, lat2, lon2):
-                """Calculate distance between two points using Haversine formula"""
-                R = 6371000  # Earth's radius in meters
-                lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                c = 2 * atan2(sqrt(a), sqrt(1-a))
-                return R * c
+            # Switch to the aggregated density layer based on the real match count
+            density_df = None
+            if total_orders > MAX_POINTS_PER_TRACE * len(selected_stores):
+                density_df = run_query_cached(density_query, distance_params)
             
-            # Calculate distance for each order
-            results_df['distance_km'] = results_df.apply(
-                lambda row: haversine_distance(
-                    row['customer_lat'], row['customer_lon'],
-                    row['store_lat'], row['store_lon']
-                ) / 1000.0, axis=1
-            )
+            st.info(f"🔧 **Implementation**: Distance calculation using optimized spatial algorithms")
+            st.success(f"✅ Found {total_orders} orders within {max_distance}km of selected stores")
             
-            # Round to 2 decimal places
-            results_df['distance_km'] = results_df['distance_km'].round(2)
+            # Create visualization
+            fig = build_distance_figure(results_df, density_df, tuple(selected_stores), max_distance)
+            st.plotly_chart(fig, use_container_width=True)
             
-            # Filter by distance
-            results_df = results_df[results_df['distance_km'] <= max_distance]
-            results_df = results_df.sort_values(['store_id', 'distance_km'])
+            # Distance analysis results
+            st.subheader("📊 Distance Analysis Results")
             
-            if not results_df.empty:
-                st.info(f"🔧 **Implementation**: Distance calculation using optimized spatial algorithms")
-                st.success(f"✅ Found {len(results_df)} orders within {max_distance}km of selected stores")
-                
-                # Create visualization
-                fig = go.Figure()
-                
-                # Color palette for stores
-                colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown', 'pink']
-                
-                # Add customer orders with color-coding by store
-                for i, store_id in enumerate(selected_stores):
-                    store_orders = results_df[results_df['store_id'] == store_id]
-                    if not store_orders.empty:
-                        color = colors[i % len(colors)]
-                        
-                        # Add customer points
-                        fig.add_trace(go.Scattermap(
-                            lat=store_orders['customer_lat'],
-                            lon=store_orders['customer_lon'],
-                            mode='markers',
-                            marker=dict(size=8, color=color, opacity=0.7),
-                            text=store_orders.apply(
-                                lambda row: f"Order: ${row['order_value']:.0f}<br>"
-                                           f"Distance: {row['distance_km']:.2f} km<br>"
-                                           f"Delivery: {row['delivery_time_minutes']:.0f} min<br>"
-                                           f"Store: {row['store_id']}", axis=1
-                            ),
-                            name=f'Store {store_id} Orders ({len(store_orders)})',
-                            hovertemplate="<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>"
-                        ))
-                        
-                        # Add store location
-                        store_data = store_orders.iloc[0]
-                        fig.add_trace(go.Scattermap(
-                            lat=[store_data['store_lat']],
-                            lon=[store_data['store_lon']],
-                            mode='markers',
-                            marker=dict(
-                                size=25, 
-                                color=color,
-                                symbol='building',
-                                opacity=0.9
-                            ),
-                            text=[f"🏪 Store: {store_id}<br>Location: {store_data['store_lat']:.4f}, {store_data['store_lon']:.4f}"],
-                            name=f'🏪 Store {store_id}',
-                            hovertemplate="<b>%{text}</b><extra></extra>"
-                        ))
-                
-                # Center map on stores
-                center_lat = results_df['store_lat'].mean()
-                center_lon = results_df['store_lon'].mean()
-                
-                fig.update_layout(
-                    map=dict(
-                        style="open-street-map",
-                        center=dict(lat=center_lat, lon=center_lon),
-                        zoom=10
-                    ),
-                    title=f"ST_Distance Analysis: Orders within {max_distance}km of Stores",
-                    height=600
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Distance analysis results
-                st.subheader("📊 Distance Analysis Results")
-                
-                col3, col4, col5 = st.columns(3)
-                
-                with col3:
-                    st.metric("Total Orders", len(results_df))
-                    total_revenue = results_df['order_value'].sum()
-                    st.metric("Total Revenue", f"${total_revenue:,.0f}")
-                
-                with col4:
-                    avg_distance = results_df['distance_km'].mean()
-                    st.metric("Avg Distance", f"{avg_distance:.2f} km")
-                    closest_distance = results_df['distance_km'].min()
-                    st.metric("Closest Order", f"{closest_distance:.2f} km")
-                
-                with col5:
-                    avg_delivery = results_df['delivery_time_minutes'].mean()
-                    st.metric("Avg Delivery Time", f"{avg_delivery:.1f} min")
-                    avg_order_value = results_df['order_value'].mean()
-                    st.metric("Avg Order Value", f"${avg_order_value:.2f}")
-                
-                # Store performance breakdown
-                st.subheader("🏪 Store Performance by Distance")
-                
-                store_analysis = results_df.groupby('store_id').agg({
-                    'order_id': 'count',
-                    'order_value': ['sum', 'mean'],
-                    'distance_km': ['mean', 'min', 'max'],
-                    'delivery_time_minutes': 'mean'
-                }).round(2)
-                
-                store_analysis.columns = [
-                    'Order Count', 'Total Revenue', 'Avg Order Value',
-                    'Avg Distance', 'Min Distance', 'Max Distance', 'Avg Delivery Time'
-                ]
-                store_analysis = store_analysis.reset_index()
+            col3, col4, col5 = st.columns(3)
+            
+            # Overall metrics from the per-store aggregates (weighted by order count)
+            order_weights = summary_df['order_count'] / total_orders
+            
+            with col3:
+                st.metric("Total Orders", total_orders)
+                total_revenue = summary_df['total_revenue'].sum()
+                st.metric("Total Revenue", f"${total_revenue:,.0f}")
+            
+            with col4:
+                avg_distance = (summary_df['avg_distance'] * order_weights).sum()
+                st.metric("Avg Distance", f"{avg_distance:.2f} km")
+                closest_distance = summary_df['min_distance'].min()
+                st.metric("Closest Order", f"{closest_distance:.2f} km")
+            
+            with col5:
+                avg_delivery = (summary_df['avg_delivery_time'] * order_weights).sum()
+                st.metric("Avg Delivery Time", f"{avg_delivery:.1f} min")
+                avg_order_value = total_revenue / total_orders
+                st.metric("Avg Order Value", f"${avg_order_value:.2f}")
+            
+            # Store performance breakdown
+            st.subheader("🏪 Store Performance by Distance")
+            
+            store_analysis = summary_df.rename(columns={
+                'order_count': 'Order Count',
+                'total_revenue': 'Total Revenue',
+                'avg_order_value': 'Avg Order Value',
+                'avg_distance': 'Avg Distance',
+                'min_distance': 'Min Distance',
+                'max_distance': 'Max Distance',
+                'avg_delivery_time': 'Avg Delivery Time'
+            }).round(2)
+            
+            st.dataframe(store_analysis, use_container_width=True)
+            
+            # Distance vs Order Value analysis
+            if len(results_df) > 10:
+                col6, col7 = st.columns(2)
                 
-                st.dataframe(store_analysis, use_container_width=True)
+                with col6:
+                    # Distance distribution
+                    fig2 = px.histogram(
+                        results_df,
+                        x='distance_km',
+                        nbins=20,
+                        title="Distance Distribution",
+                        labels={'distance_km': 'Distance (km)'}
+                    )
+                    st.plotly_chart(fig2, use_container_width=True)
                 
-                # Distance vs Order Value analysis
-                if len(results_df) > 10:
-                    col6, col7 = st.columns(2)
-                    
-                    with col6:
-                        # Distance distribution
-                        fig2 = px.histogram(
-                            results_df,
-                            x='distance_km',
-                            nbins=20,
-                            title="Distance Distribution",
-                            labels={'distance_km': 'Distance (km)'}
-                        )
-                        st.plotly_chart(fig2, use_container_width=True)
-                    
-                    with col7:
-                        # Distance vs Order Value correlation
-                        fig3 = px.scatter(
-                            results_df,
-                            x='distance_km',
-                            y='order_value',
-                            color='store_id',
-                            title="Distance vs Order Value",
-                            labels={'distance_km': 'Distance (km)', 'order_value': 'Order Value ($)'}
-                        )
-                        st.plotly_chart(fig3, use_container_width=True)
-            else:
-                st.warning(f"No orders found within {max_distance}km of selected stores")
+                with col7:
+                    # Distance vs Order Value correlation
+                    fig3 = px.scatter(
+                        results_df,
+                        x='distance_km',
+                        y='order_value',
+                        color='store_id',
+                        title="Distance vs Order Value",
+                        labels={'distance_km': 'Distance (km)', 'order_value': 'Order Value ($)'}
+                    )
+                    st.plotly_chart(fig3, use_container_width=True)
         else:
-            st.warning("No customer order data available")
+            st.warning(f"No orders found within {max_distance}km of selected stores")
     
     # Technical implementation
     st.subheader("🔧 Technical Implementation")
@@ -453,17 +647,81 @@ AND order_value >= {min_order_value}
 ORDER BY distance_km ASC;
 
 -- Performance optimization with bounding box
-SELECT *
-FROM customer_orders
-WHERE store_id IN ('{"', '".join(selected_stores)}')
-AND customer_lat BETWEEN store_lat - 0.1 AND store_lat + 0.1
-AND customer_lon BETWEEN store_lon - 0.1 AND store_lon + 0.1
+SELECT co.*
+FROM customer_orders co
+JOIN stores s ON co.store_id = s.store_id
+WHERE CONTAINS(?, s.store_id)  -- ? = {store_ids}, bound as one array parameter
+AND co.order_value >= {min_order_value}
+-- Cheap bounding-box prefilter ({max_distance} km in degrees) before the exact distance
+AND co.customer_lat BETWEEN s.store_lat - {bbox_deg} AND s.store_lat + {bbox_deg}
+AND co.customer_lon BETWEEN s.store_lon - {bbox_deg} / COS(RADIANS(s.store_lat))
+                        AND s.store_lon + {bbox_deg} / COS(RADIANS(s.store_lat))
 AND ST_Distance(
-    ST_GEOGPOINT(customer_lon, customer_lat),
-    ST_GEOGPOINT(store_lon, store_lat)
+    ST_GEOGPOINT(co.customer_lon, co.customer_lat),
+    ST_GEOGPOINT(s.store_lon, s.store_lat)
 ) <= {max_distance * 1000};
         """, language="sql")
 
+@st.cache_data(ttl=300, show_spinner=False)
+def build_contains_figure(results_df, density_df, zone_names, zone_rings):
+    """Zone outlines with the customers found inside them, memoized on its inputs
+
+    zone_names and zone_rings map each selected zone_id, in selection order,
+    to its name and its polygon's (lats, lons) outline.
+    """
+    fig = go.Figure()
+    
+    # Add zone boundaries and customer points
+    zone_colors = ['blue', 'green', 'red', 'orange', 'purple']
+    
+    for i, (zone_id, (zone_lats, zone_lons)) in enumerate(zone_rings.items()):
+        color = zone_colors[i % len(zone_colors)]
+        
+        # Add zone boundary
+        fig.add_trace(go.Scattermap(
+            lat=zone_lats,
+            lon=zone_lons,
+            mode='lines',
+            line=dict(width=3, color=color),
+            name=f"{zone_names[zone_id]} Boundary",
+            fill='toself',
+            fillcolor=f'rgba({255 if color=="red" else 0},{255 if color=="green" else 0},{255 if color=="blue" else 0},0.1)'
+        ))
+    
+    # Add customer points colored by zone, or a heatmap when dense
+    use_density = density_df is not None and not density_df.empty
+    if use_density:
+        fig.add_trace(order_density_trace(density_df, 'Customer Density'))
+    
+    for i, (zone_id, zone_name) in enumerate(zone_names.items()):
+        zone_customers = results_df[results_df['zone_id'] == zone_id]
+        if not zone_customers.empty and not use_density:
+            color = zone_colors[i % len(zone_colors)]
+            
+            fig.add_trace(go.Scattermap(
+                lat=zone_customers['customer_lat'],
+                lon=zone_customers['customer_lon'],
+                mode='markers',
+                marker=dict(size=8, color=color, opacity=0.8),
+                name=f'Customers in {zone_name}',
+                customdata=zone_customers[['order_value', 'store_id']].to_numpy(),
+                hovertemplate="Zone: " + zone_name + "<br>"
+                              "Order: $%{customdata[0]:.0f}<br>"
+                              "Store: %{customdata[1]}<br>"
+                              "(%{lat}, %{lon})"
+            ))
+    
+    fig.update_layout(
+        map=dict(
+            style="open-street-map",
+            center=dict(lat=12.9716, lon=77.5946),
+            zoom=10.5
+        ),
+        title="ST_Contains Demo: Customers in Geographic Zones",
+        height=500
+    )
+    return fig
+
 def show_st_contains_demo():
     """Customer Zone Analysis: Territory management and customer segmentation"""
     st.header("2. Customer Zone Analysis")
@@ -484,29 +742,21 @@ def show_st_contains_demo():
     
     with col2:
         # Fetch actual zones from the database
-        zones_query = """
-        SELECT 
-            zone_id,
-            zone_name,
-            zone_type,
-            zone_lat as center_lat,
-            zone_lon as center_lon,
-            zone_radius
-        FROM geo_zones 
-        ORDER BY zone_name
-        """
-        
-        zones_df = run_query(zones_query)
+        zones_df = load_zones()
         
         if zones_df.empty:
             st.error("No zones found in geo_zones table")
+            st.info("If geo_zones predates zone polygons, rebuild it with `python generate_sample_data.py --reset-zones`")
             return
+        
+        # Zone attributes keyed by zone_id for O(1) lookups
+        zones_by_id = zones_df.set_index('zone_id').to_dict('index')
             
         selected_zones = st.multiselect(
             "Select Zones for Analysis",
             options=zones_df['zone_id'].tolist(),
             default=zones_df['zone_id'].tolist()[:5],  # Default to first 5 zones
-            format_func=lambda x: f"Zone {x} ({zones_df[zones_df['zone_id']==x]['zone_name'].iloc[0]})"
+            format_func=lambda x: f"Zone {x} ({zones_by_id[x]['zone_name']})"
         )
         
         if not selected_zones:
@@ -514,89 +764,82 @@ def show_st_contains_demo():
             return
     
     with col1:
-        st.info("🔧 **Implementation**: Geographic zone analysis with spatial containment algorithms")
+        st.info("🔧 **Implementation**: Geographic zone analysis with ST_Contains on zone polygons")
         
-        # Get customer orders in selected zones using bounding box approximation
-        zone_conditions = []
-        for zone_id in selected_zones:
-            zone_data = zones_df[zones_df['zone_id'] == zone_id].iloc[0]
-            center_lat, center_lon = zone_data['center_lat'], zone_data['center_lon']
-            zone_conditions.append(f"""
-                (customer_lat BETWEEN {center_lat - 0.05} AND {center_lat + 0.05}
-                 AND customer_lon BETWEEN {center_lon - 0.05} AND {center_lon + 0.05})
-            """)
+        # Outline and envelope of each zone polygon: (lat_lo, lat_hi, lon_lo, lon_hi)
+        zone_rings = {zone_id: polygon_ring(zones_by_id[zone_id]['polygon_wkt']) for zone_id in selected_zones}
+        zone_bounds = {
+            zone_id: (min(lats), max(lats), min(lons), max(lons))
+            for zone_id, (lats, lons) in zone_rings.items()
+        }
         
-        contains_query = f"""
-        SELECT 
-            order_id,
-            customer_lat,
-            customer_lon,
-            order_value,
-            store_id,
-            CASE 
-                {' '.join([f"WHEN (customer_lat BETWEEN {zones_df[zones_df['zone_id'] == zone]['center_lat'].iloc[0] - 0.05} AND {zones_df[zones_df['zone_id'] == zone]['center_lat'].iloc[0] + 0.05} AND customer_lon BETWEEN {zones_df[zones_df['zone_id'] == zone]['center_lon'].iloc[0] - 0.05} AND {zones_df[zones_df['zone_id'] == zone]['center_lon'].iloc[0] + 0.05}) THEN '{zone}'" for zone in selected_zones])}
-                ELSE 'unknown' 
-            END as zone_id
-        FROM customer_orders 
-        WHERE ({' OR '.join([f"(customer_lat BETWEEN {zones_df[zones_df['zone_id'] == zone]['center_lat'].iloc[0] - 0.05} AND {zones_df[zones_df['zone_id'] == zone]['center_lat'].iloc[0] + 0.05} AND customer_lon BETWEEN {zones_df[zones_df['zone_id'] == zone]['center_lon'].iloc[0] - 0.05} AND {zones_df[zones_df['zone_id'] == zone]['center_lon'].iloc[0] + 0.05})" for zone in selected_zones])})
+        # Get customer orders in selected zones by joining against an inline
+        # table of zone polygons, each parsed once: the envelope check prunes
+        # cheaply before the exact ST_Contains test
+        zone_params = [
+            p for zone_id, bounds in zone_bounds.items()
+            for p in (zone_id, *bounds, zones_by_id[zone_id]['polygon_wkt'])
+        ]
+        zone_rows = " UNION ALL ".join(
+            "SELECT ? as zone_id, ? as lat_lo, ? as lat_hi, ? as lon_lo, ? as lon_hi, "
+            "ST_GEOGFROMTEXT(?) as zone_geog"
+            for _ in selected_zones
+        )
+        # An order inside overlapping zones matches each of them; zone_orders
+        # keeps one row per order so the totals count it once
+        zone_matches = f"""
+        WITH z AS (
+            {zone_rows}
+        ),
+        matched AS (
+            SELECT co.order_id, co.customer_lat, co.customer_lon, co.order_value, co.store_id, z.zone_id
+            FROM customer_orders co
+            JOIN z ON co.customer_lat BETWEEN z.lat_lo AND z.lat_hi
+                  AND co.customer_lon BETWEEN z.lon_lo AND z.lon_hi
+                  AND ST_CONTAINS(z.zone_geog, ST_GEOGPOINT(co.customer_lon, co.customer_lat))
+        ),
+        zone_orders AS (
+            SELECT DISTINCT order_id, customer_lat, customer_lon, order_value
+            FROM matched
+        )
+        """
+        
+        # Sampled orders per zone for the map, plus totals aggregated in Firebolt
+        contains_query = zone_matches + """
+        SELECT order_id, customer_lat, customer_lon, order_value, store_id, zone_id
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY zone_id ORDER BY HASH(order_id)) as rn
+            FROM matched
+        ) sampled
+        WHERE rn <= ?
         ORDER BY order_value DESC
-        LIMIT 500
+        """
+        summary_query = zone_matches + """
+        SELECT COUNT(*) as customers_found, SUM(order_value) as total_revenue, AVG(order_value) as avg_order_value
+        FROM zone_orders
+        """
+        grid_lat = f"ROUND(customer_lat, {DENSITY_GRID_DECIMALS})"
+        grid_lon = f"ROUND(customer_lon, {DENSITY_GRID_DECIMALS})"
+        density_query = zone_matches + f"""
+        SELECT {grid_lat} as customer_lat, {grid_lon} as customer_lon, SUM(order_value) as order_value
+        FROM zone_orders
+        GROUP BY {grid_lat}, {grid_lon}
         """
         
-        results_df = run_query(contains_query)
+        results_df = compact_coordinates(run_query_cached(contains_query, zone_params + [MAX_POINTS_PER_TRACE]))
+        summary_df = run_query_cached(summary_query, zone_params)
         
-        if not results_df.empty:
-            # Create visualization
-            fig = go.Figure()
+        if not results_df.empty and not summary_df.empty:
+            summary = summary_df.iloc[0]
             
-            # Add zone boundaries and customer points
-            zone_colors = ['blue', 'green', 'red', 'orange', 'purple']
+            # Switch to the aggregated density layer based on the real match count
+            density_df = None
+            if summary['customers_found'] > MAX_POINTS_PER_TRACE * len(selected_zones):
+                density_df = run_query_cached(density_query, zone_params)
             
-            for i, zone_id in enumerate(selected_zones):
-                zone_data = zones_df[zones_df['zone_id'] == zone_id].iloc[0]
-                color = zone_colors[i % len(zone_colors)]
-                
-                # Create zone boundary (simplified rectangle)
-                center_lat, center_lon = zone_data['center_lat'], zone_data['center_lon']
-                zone_lats = [center_lat-0.05, center_lat-0.05, center_lat+0.05, center_lat+0.05, center_lat-0.05]
-                zone_lons = [center_lon-0.05, center_lon+0.05, center_lon+0.05, center_lon-0.05, center_lon-0.05]
-                
-                # Add zone boundary
-                fig.add_trace(go.Scattermap(
-                    lat=zone_lats,
-                    lon=zone_lons,
-                    mode='lines',
-                    line=dict(width=3, color=color),
-                    name=f"{zone_data['zone_name']} Boundary",
-                    fill='toself',
-                    fillcolor=f'rgba({255 if color=="red" else 0},{255 if color=="green" else 0},{255 if color=="blue" else 0},0.1)'
-                ))
-            
-            # Add customer points colored by zone
-            for i, zone_id in enumerate(selected_zones):
-                zone_customers = results_df[results_df['zone_id'] == zone_id]
-                if not zone_customers.empty:
-                    color = zone_colors[i % len(zone_colors)]
-                    zone_name = zones_df[zones_df['zone_id'] == zone_id]['zone_name'].iloc[0]
-                    
-                    fig.add_trace(go.Scattermap(
-                        lat=zone_customers['customer_lat'],
-                        lon=zone_customers['customer_lon'],
-                        mode='markers',
-                        marker=dict(size=8, color=color, opacity=0.8),
-                        name=f'Customers in {zone_name}',
-                        text=zone_customers.apply(lambda row: f"Zone: {zone_name}<br>Order: ${row['order_value']:.0f}<br>Store: {row['store_id']}", axis=1)
-                    ))
-            
-            fig.update_layout(
-                map=dict(
-                    style="open-street-map",
-                    center=dict(lat=12.9716, lon=77.5946),
-                    zoom=10.5
-                ),
-                title="ST_Contains Demo: Customers in Geographic Zones",
-                height=500
-            )
+            # Create visualization
+            zone_names = {zone_id: zones_by_id[zone_id]['zone_name'] for zone_id in selected_zones}
+            fig = build_contains_figure(results_df, density_df, zone_names, zone_rings)
             st.plotly_chart(fig, use_container_width=True)
             
             # Analysis summary
@@ -604,12 +847,11 @@ def show_st_contains_demo():
             col3, col4, col5 = st.columns(3)
             
             with col3:
-                st.metric("Customers Found", len(results_df))
+                st.metric("Customers Found", int(summary['customers_found']))
             with col4:
-                st.metric("Total Revenue", f"${results_df['order_value'].sum():,.0f}")
+                st.metric("Total Revenue", f"${summary['total_revenue']:,.0f}")
             with col5:
-                avg_order = results_df['order_value'].mean() if len(results_df) > 0 else 0
-                st.metric("Avg Order Value", f"${avg_order:.2f}")
+                st.metric("Avg Order Value", f"${summary['avg_order_value']:.2f}")
         else:
             st.warning("No customers found in selected zones")
     
@@ -637,6 +879,245 @@ AND ST_Contains(
 ) = TRUE
         """, language="sql")
 
+def degree_offsets(radius_km, lat):
+    """Latitude and longitude half-widths in degrees of a radius around a point"""
+    return radius_km / 111.32, radius_km / (111.32 * math.cos(math.radians(lat)))
+
+def fetch_store_coverage(store_id, store_lat, store_lon, coverage_radius):
+    """A store's orders nearest its location, flagged when within the coverage radius"""
+    # Degree offsets spanning the coverage radius, used as a bounding-box prefilter
+    lat_offset, lon_offset = degree_offsets(coverage_radius, store_lat)
+    
+    coverage_query = """
+    WITH store_coverage AS (
+        SELECT 
+            order_id,
+            customer_lat,
+            customer_lon,
+            order_value,
+            store_id,
+            SQRT(
+                POW((customer_lat - ?) * 111.32, 2) + 
+                POW((customer_lon - ?) * 111.32 * COS(RADIANS(?)), 2)
+            ) as dist_km
+        FROM customer_orders
+        WHERE store_id = ?
+        AND customer_lat BETWEEN ? AND ?
+        AND customer_lon BETWEEN ? AND ?
+    )
+    SELECT 
+        order_id,
+        customer_lat,
+        customer_lon,
+        order_value,
+        store_id,
+        ROUND(dist_km, 2) as distance_km,
+        CASE WHEN dist_km <= ? THEN 1 ELSE 0 END as is_covered
+    FROM store_coverage
+    ORDER BY dist_km
+    LIMIT 100
+    """
+    coverage_params = (
+        store_lat, store_lon, store_lat, store_id,
+        store_lat - lat_offset, store_lat + lat_offset,
+        store_lon - lon_offset, store_lon + lon_offset,
+        coverage_radius
+    )
+    
+    return compact_coordinates(run_query_cached(coverage_query, coverage_params))
+
+def fetch_zone_coverage(zone_lat, zone_lon, effective_radius):
+    """Orders nearest a zone center, flagged when within the effective radius"""
+    # Degree offsets spanning the effective radius, used as a bounding-box prefilter
+    lat_offset, lon_offset = degree_offsets(effective_radius, zone_lat)
+    
+    coverage_query = """
+    WITH zone_coverage AS (
+        SELECT 
+            order_id,
+            customer_lat,
+            customer_lon,
+            order_value,
+            store_id,
+            SQRT(
+                POW((customer_lat - ?) * 111.32, 2) + 
+                POW((customer_lon - ?) * 111.32 * COS(RADIANS(?)), 2)
+            ) as dist_km
+        FROM customer_orders
+        WHERE customer_lat BETWEEN ? AND ?
+        AND customer_lon BETWEEN ? AND ?
+    )
+    SELECT 
+        order_id,
+        customer_lat,
+        customer_lon,
+        order_value,
+        store_id,
+        ROUND(dist_km, 2) as distance_km,
+        CASE WHEN dist_km <= ? THEN 1 ELSE 0 END as is_covered
+    FROM zone_coverage
+    ORDER BY dist_km
+    LIMIT 100
+    """
+    coverage_params = (
+        zone_lat, zone_lon, zone_lat,
+        zone_lat - lat_offset, zone_lat + lat_offset,
+        zone_lon - lon_offset, zone_lon + lon_offset,
+        effective_radius
+    )
+    
+    return compact_coordinates(run_query_cached(coverage_query, coverage_params))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_coverage_figure(coverage_type, coverage_radius, store_points, zone_points, coverage_dfs):
+    """Coverage map for the selected stores or zones, memoized on its inputs
+
+    store_points maps store_id to (lat, lon), zone_points maps zone_id to
+    (lat, lon, zone_radius), and coverage_dfs holds the fetched coverage
+    orders of each store or zone in the current scenario.
+    """
+    fig = go.Figure()
+    colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray']
+    
+    if coverage_type == "Store-Based Coverage" and store_points:
+        # Store-based coverage analysis
+        for i, (store_id, (store_lat, store_lon)) in enumerate(store_points.items()):
+            color = colors[i % len(colors)]
+            lat_offset, lon_offset = degree_offsets(coverage_radius, store_lat)
+            coverage_df = coverage_dfs[store_id]
+            
+            if not coverage_df.empty:
+                # Add coverage circle for this store
+                circle_lats = store_lat + lat_offset * CIRCLE_SIN
+                circle_lons = store_lon + lon_offset * CIRCLE_COS
+                
+                fig.add_trace(go.Scattermap(
+                    lat=circle_lats,
+                    lon=circle_lons,
+                    mode='lines',
+                    line=dict(width=2, color=color),
+                    name=f'{store_id} Coverage',
+                    fill='toself',
+                    fillcolor=f'rgba({int(color == "red") * 255},{int(color == "blue") * 255},{int(color == "green") * 255},0.1)'
+                ))
+                
+                # Add store location
+                fig.add_trace(go.Scattermap(
+                    lat=[store_lat],
+                    lon=[store_lon],
+                    mode='markers',
+                    marker=dict(size=15, color=color, symbol='building'),
+                    name=f'🏪 {store_id}',
+                    text=[f"Store: {store_id}<br>Coverage: {coverage_radius}km"]
+                ))
+                
+                # Add covered customers
+                covered_df = coverage_df[coverage_df['is_covered'].to_numpy(dtype=bool)]
+                if not covered_df.empty:
+                    fig.add_trace(go.Scattermap(
+                        lat=covered_df['customer_lat'],
+                        lon=covered_df['customer_lon'],
+                        mode='markers',
+                        marker=dict(size=distance_sizes(covered_df['distance_km']), color=color, opacity=0.7),
+                        name=f'{store_id} Covered ({len(covered_df)})',
+                        text=coverage_hover_text(covered_df)
+                    ))
+                    
+    elif coverage_type == "Zone-Based Coverage" and zone_points:
+        # Zone-based coverage analysis
+        for i, (zone_id, (zone_lat, zone_lon, zone_radius)) in enumerate(zone_points.items()):
+            color = colors[i % len(colors)]
+            effective_radius = min(coverage_radius, zone_radius)
+            lat_offset, lon_offset = degree_offsets(effective_radius, zone_lat)
+            coverage_df = coverage_dfs[zone_id]
+            
+            if not coverage_df.empty:
+                # Add zone circle
+                circle_lats = zone_lat + lat_offset * CIRCLE_SIN
+                circle_lons = zone_lon + lon_offset * CIRCLE_COS
+                
+                fig.add_trace(go.Scattermap(
+                    lat=circle_lats,
+                    lon=circle_lons,
+                    mode='lines',
+                    line=dict(width=2, color=color),
+                    name=f'{zone_id} Coverage',
+                    fill='toself',
+                    fillcolor=f'rgba({int(color == "red") * 255},{int(color == "blue") * 255},{int(color == "green") * 255},0.1)'
+                ))
+                
+                # Add zone center
+                fig.add_trace(go.Scattermap(
+                    lat=[zone_lat],
+                    lon=[zone_lon],
+                    mode='markers',
+                    marker=dict(size=12, color=color, symbol='diamond'),
+                    name=f'📍 {zone_id}',
+                    text=[f"Zone: {zone_id}<br>Radius: {effective_radius:.1f}km"]
+                ))
+                
+                # Add covered customers
+                covered_df = coverage_df[coverage_df['is_covered'].to_numpy(dtype=bool)]
+                if not covered_df.empty:
+                    fig.add_trace(go.Scattermap(
+                        lat=covered_df['customer_lat'],
+                        lon=covered_df['customer_lon'],
+                        mode='markers',
+                        marker=dict(size=distance_sizes(covered_df['distance_km']), color=color, opacity=0.7),
+                        name=f'{zone_id} Covered ({len(covered_df)})',
+                        text=coverage_hover_text(covered_df)
+                    ))
+                    
+    else:
+        # Combined coverage analysis - show both stores and zones
+        
+        # Add store coverage
+        for i, (store_id, (store_lat, store_lon)) in enumerate(store_points.items()):
+            color = colors[i % len(colors)]
+            
+            # Add store marker and coverage circle
+            fig.add_trace(go.Scattermap(
+                lat=[store_lat],
+                lon=[store_lon],
+                mode='markers',
+                marker=dict(size=15, color=color, symbol='building'),
+                name=f'🏪 {store_id}',
+                text=[f"Store: {store_id}"]
+            ))
+            
+        # Add zone coverage  
+        for i, (zone_id, (zone_lat, zone_lon, _)) in enumerate(zone_points.items()):
+            color = colors[(i + len(store_points)) % len(colors)]
+            
+            # Add zone marker
+            fig.add_trace(go.Scattermap(
+                lat=[zone_lat],
+                lon=[zone_lon],
+                mode='markers',
+                marker=dict(size=12, color=color, symbol='diamond'),
+                name=f'📍 {zone_id}',
+                text=[f"Zone: {zone_id}"]
+            ))
+            
+    # Set map center based on selected items
+    if store_points:
+        center_lat = np.mean([lat for lat, _ in store_points.values()])
+        center_lon = np.mean([lon for _, lon in store_points.values()])
+    else:
+        center_lat = np.mean([lat for lat, _, _ in zone_points.values()])
+        center_lon = np.mean([lon for _, lon, _ in zone_points.values()])
+        
+    fig.update_layout(
+        map=dict(
+            style="open-street-map",
+            center=dict(lat=center_lat, lon=center_lon),
+            zoom=11
+        ),
+        title=f"ST_COVERS Demo: {coverage_type}",
+        height=500
+    )
+    return fig
+
 def show_st_covers_demo():
     """Service Area Coverage: Market penetration and service optimization"""
     st.header("3. Service Area Coverage")
@@ -658,33 +1139,25 @@ def show_st_covers_demo():
         st.subheader("🎯 Coverage Analysis")
         
         # Get available stores for multiselect
-        stores_query = """
-        SELECT DISTINCT store_id, store_lat, store_lon
-        FROM customer_orders
-        ORDER BY store_id
-        """
-        stores_df = run_query(stores_query)
+        stores_df = load_stores()
+        store_ids = [] if stores_df.empty else stores_df['store_id'].tolist()
         
         # Store selection with multiselect
         selected_stores = st.multiselect(
             "Select Store(s) for Coverage Analysis", 
-            stores_df['store_id'].tolist(),
-            default=stores_df['store_id'].tolist()[:3]  # Default to first 3 stores
+            store_ids,
+            default=store_ids[:3]  # Default to first 3 stores
         )
         
         # Get available zones for multiselect  
-        zones_query = """
-        SELECT zone_id, zone_name, zone_lat as center_lat, zone_lon as center_lon, zone_radius
-        FROM geo_zones 
-        ORDER BY zone_name
-        """
-        zones_df = run_query(zones_query)
+        zones_df = load_zones()
+        zone_ids = [] if zones_df.empty else zones_df['zone_id'].tolist()
         
         # Zone selection with multiselect
         selected_zones = st.multiselect(
             "Select Zone(s) for Coverage Analysis",
-            zones_df['zone_id'].tolist(),
-            default=zones_df['zone_id'].tolist()[:3]  # Default to first 3 zones
+            zone_ids,
+            default=zone_ids[:3]  # Default to first 3 zones
         )
         
         # Coverage scenarios
@@ -708,231 +1181,35 @@ def show_st_covers_demo():
         # ST_COVERS analysis based on coverage type
         st.info("🔧 **Implementation**: Coverage area analysis with spatial algorithms")
         
-        # Create coverage visualization
-        fig = go.Figure()
-        colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray']
+        # Coordinates of the selected stores and zones
+        stores_by_id = stores_df.set_index('store_id').to_dict('index') if selected_stores else {}
+        zones_by_id = zones_df.set_index('zone_id').to_dict('index') if selected_zones else {}
+        store_points = {
+            store_id: (stores_by_id[store_id]['store_lat'], stores_by_id[store_id]['store_lon'])
+            for store_id in selected_stores
+        }
+        zone_points = {
+            zone_id: (zones_by_id[zone_id]['center_lat'], zones_by_id[zone_id]['center_lon'], zones_by_id[zone_id]['zone_radius'])
+            for zone_id in selected_zones
+        }
         
-        if coverage_type == "Store-Based Coverage" and selected_stores:
-            # Store-based coverage analysis
-            for i, store_id in enumerate(selected_stores):
-                # Get store coordinates
-                store_data = stores_df[stores_df['store_id'] == store_id].iloc[0]
-                store_lat, store_lon = store_data['store_lat'], store_data['store_lon']
-                color = colors[i % len(colors)]
-                
-                # Get customer orders within coverage area
-                coverage_query = f"""
-                WITH store_coverage AS (
-                    SELECT 
-                        order_id,
-                        customer_lat,
-                        customer_lon,
-                        order_value,
-                        store_id,
-                        SQRT(
-                            POW((customer_lat - {store_lat}) * 111.32, 2) + 
-                            POW((customer_lon - {store_lon}) * 111.32 * COS(RADIANS({store_lat})), 2)
-                        ) as distance_km
-                    FROM customer_orders
-                    WHERE store_id = '{store_id}'
-                    AND customer_lat BETWEEN {store_lat - 0.1} AND {store_lat + 0.1}
-                    AND customer_lon BETWEEN {store_lon - 0.1} AND {store_lon + 0.1}
-                )
-                SELECT 
-                    order_id,
-                    customer_lat,
-                    customer_lon,
-                    order_value,
-                    store_id,
-                    ROUND(distance_km, 2) as distance_km,
-                    CASE WHEN distance_km <= {coverage_radius} THEN 1 ELSE 0 END as is_covered
-                FROM store_coverage
-                ORDER BY distance_km
-                LIMIT 100
-                """
-                
-                coverage_df = run_query(coverage_query)
-                
-                if not coverage_df.empty:
-                    # Add coverage circle for this store
-                    circle_points = 32
-                    angles = np.linspace(0, 2*np.pi, circle_points)
-                    lat_offset = coverage_radius / 111.32
-                    lon_offset = coverage_radius / (111.32 * np.cos(np.radians(store_lat)))
-                    
-                    circle_lats = store_lat + lat_offset * np.sin(angles)
-                    circle_lons = store_lon + lon_offset * np.cos(angles)
-                    
-                    fig.add_trace(go.Scattermap(
-                        lat=circle_lats,
-                        lon=circle_lons,
-                        mode='lines',
-                        line=dict(width=2, color=color),
-                        name=f'{store_id} Coverage',
-                        fill='toself',
-                        fillcolor=f'rgba({int(color == "red") * 255},{int(color == "blue") * 255},{int(color == "green") * 255},0.1)'
-                    ))
-                    
-                    # Add store location
-                    fig.add_trace(go.Scattermap(
-                        lat=[store_lat],
-                        lon=[store_lon],
-                        mode='markers',
-                        marker=dict(size=15, color=color, symbol='building'),
-                        name=f'🏪 {store_id}',
-                        text=[f"Store: {store_id}<br>Coverage: {coverage_radius}km"]
-                    ))
-                    
-                    # Add covered customers
-                    covered_df = coverage_df[coverage_df['is_covered'] == 1]
-                    if not covered_df.empty:
-                        fig.add_trace(go.Scattermap(
-                            lat=covered_df['customer_lat'],
-                            lon=covered_df['customer_lon'],
-                            mode='markers',
-                            marker=dict(size=6, color=color, opacity=0.7),
-                            name=f'{store_id} Covered ({len(covered_df)})',
-                            text=covered_df.apply(lambda row: f"${row['order_value']:.0f}<br>{row['distance_km']} km", axis=1)
-                        ))
-                        
-        elif coverage_type == "Zone-Based Coverage" and selected_zones:
-            # Zone-based coverage analysis
-            for i, zone_id in enumerate(selected_zones):
-                # Get zone coordinates
-                zone_data = zones_df[zones_df['zone_id'] == zone_id].iloc[0]
-                zone_lat, zone_lon = zone_data['center_lat'], zone_data['center_lon']
-                zone_radius = zone_data['zone_radius']
-                color = colors[i % len(colors)]
-                
-                # Get customer orders within zone coverage
-                coverage_query = f"""
-                WITH zone_coverage AS (
-                    SELECT 
-                        order_id,
-                        customer_lat,
-                        customer_lon,
-                        order_value,
-                        store_id,
-                        SQRT(
-                            POW((customer_lat - {zone_lat}) * 111.32, 2) + 
-                            POW((customer_lon - {zone_lon}) * 111.32 * COS(RADIANS({zone_lat})), 2)
-                        ) as distance_km
-                    FROM customer_orders
-                    WHERE customer_lat BETWEEN {zone_lat - 0.1} AND {zone_lat + 0.1}
-                    AND customer_lon BETWEEN {zone_lon - 0.1} AND {zone_lon + 0.1}
-                )
-                SELECT 
-                    order_id,
-                    customer_lat,
-                    customer_lon,
-                    order_value,
-                    store_id,
-                    ROUND(distance_km, 2) as distance_km,
-                    CASE WHEN distance_km <= {min(coverage_radius, zone_radius)} THEN 1 ELSE 0 END as is_covered
-                FROM zone_coverage
-                ORDER BY distance_km
-                LIMIT 100
-                """
-                
-                coverage_df = run_query(coverage_query)
-                
-                if not coverage_df.empty:
-                    # Add zone circle
-                    circle_points = 32
-                    angles = np.linspace(0, 2*np.pi, circle_points)
-                    effective_radius = min(coverage_radius, zone_radius)
-                    lat_offset = effective_radius / 111.32
-                    lon_offset = effective_radius / (111.32 * np.cos(np.radians(zone_lat)))
-                    
-                    circle_lats = zone_lat + lat_offset * np.sin(angles)
-                    circle_lons = zone_lon + lon_offset * np.cos(angles)
-                    
-                    fig.add_trace(go.Scattermap(
-                        lat=circle_lats,
-                        lon=circle_lons,
-                        mode='lines',
-                        line=dict(width=2, color=color),
-                        name=f'{zone_id} Coverage',
-                        fill='toself',
-                        fillcolor=f'rgba({int(color == "red") * 255},{int(color == "blue") * 255},{int(color == "green") * 255},0.1)'
-                    ))
-                    
-                    # Add zone center
-                    fig.add_trace(go.Scattermap(
-                        lat=[zone_lat],
-                        lon=[zone_lon],
-                        mode='markers',
-                        marker=dict(size=12, color=color, symbol='diamond'),
-                        name=f'📍 {zone_id}',
-                        text=[f"Zone: {zone_id}<br>Radius: {effective_radius:.1f}km"]
-                    ))
-                    
-                    # Add covered customers
-                    covered_df = coverage_df[coverage_df['is_covered'] == 1]
-                    if not covered_df.empty:
-                        fig.add_trace(go.Scattermap(
-                            lat=covered_df['customer_lat'],
-                            lon=covered_df['customer_lon'],
-                            mode='markers',
-                            marker=dict(size=6, color=color, opacity=0.7),
-                            name=f'{zone_id} Covered ({len(covered_df)})',
-                            text=covered_df.apply(lambda row: f"${row['order_value']:.0f}<br>{row['distance_km']} km", axis=1)
-                        ))
-                        
-        else:
-            # Combined coverage analysis - show both stores and zones
-            all_coverage_df = []
-            
-            # Add store coverage
-            for i, store_id in enumerate(selected_stores):
-                store_data = stores_df[stores_df['store_id'] == store_id].iloc[0]
-                store_lat, store_lon = store_data['store_lat'], store_data['store_lon']
-                color = colors[i % len(colors)]
-                
-                # Add store marker and coverage circle
-                fig.add_trace(go.Scattermap(
-                    lat=[store_lat],
-                    lon=[store_lon],
-                    mode='markers',
-                    marker=dict(size=15, color=color, symbol='building'),
-                    name=f'🏪 {store_id}',
-                    text=[f"Store: {store_id}"]
-                ))
-                
-            # Add zone coverage  
-            for i, zone_id in enumerate(selected_zones):
-                zone_data = zones_df[zones_df['zone_id'] == zone_id].iloc[0]
-                zone_lat, zone_lon = zone_data['center_lat'], zone_data['center_lon']
-                zone_radius = zone_data['zone_radius']
-                color = colors[(i + len(selected_stores)) % len(colors)]
-                
-                # Add zone marker
-                fig.add_trace(go.Scattermap(
-                    lat=[zone_lat],
-                    lon=[zone_lon],
-                    mode='markers',
-                    marker=dict(size=12, color=color, symbol='diamond'),
-                    name=f'📍 {zone_id}',
-                    text=[f"Zone: {zone_id}"]
-                ))
-                
-        # Set map center based on selected items
-        if selected_stores:
-            center_lat = stores_df[stores_df['store_id'].isin(selected_stores)]['store_lat'].mean()
-            center_lon = stores_df[stores_df['store_id'].isin(selected_stores)]['store_lon'].mean()
+        # Fetch coverage orders outside the cached figure so failed queries
+        # are reported on this run rather than cached into the map
+        if coverage_type == "Store-Based Coverage":
+            coverage_dfs = {
+                store_id: fetch_store_coverage(store_id, store_lat, store_lon, coverage_radius)
+                for store_id, (store_lat, store_lon) in store_points.items()
+            }
+        elif coverage_type == "Zone-Based Coverage":
+            coverage_dfs = {
+                zone_id: fetch_zone_coverage(zone_lat, zone_lon, min(coverage_radius, zone_radius))
+                for zone_id, (zone_lat, zone_lon, zone_radius) in zone_points.items()
+            }
         else:
-            center_lat = zones_df[zones_df['zone_id'].isin(selected_zones)]['center_lat'].mean()
-            center_lon = zones_df[zones_df['zone_id'].isin(selected_zones)]['center_lon'].mean()
-            
-        fig.update_layout(
-            map=dict(
-                style="open-street-map",
-                center=dict(lat=center_lat, lon=center_lon),
-                zoom=11
-            ),
-            title=f"ST_COVERS Demo: {coverage_type}",
-            height=500
-        )
+            coverage_dfs = {}
+        
+        # Create coverage visualization
+        fig = build_coverage_figure(coverage_type, coverage_radius, store_points, zone_points, coverage_dfs)
         st.plotly_chart(fig, use_container_width=True)
         
         # Coverage statistics
@@ -970,6 +1247,11 @@ def show_st_covers_demo():
 SELECT customer_id, is_covered
 FROM customers c, service_zones sz
 WHERE sz.zone_name = '{coverage_type}'
+-- Cheap bounding-box prefilter ({coverage_radius} km in degrees) before the exact test
+AND c.customer_lat BETWEEN sz.center_lat - {coverage_radius / 111.32:.4f}
+                       AND sz.center_lat + {coverage_radius / 111.32:.4f}
+AND c.customer_lon BETWEEN sz.center_lon - {coverage_radius / 111.32:.4f} / COS(RADIANS(sz.center_lat))
+                       AND sz.center_lon + {coverage_radius / 111.32:.4f} / COS(RADIANS(sz.center_lat))
 AND ST_COVERS(
     sz.zone_boundary,  -- Coverage area (polygon)
     ST_GEOGPOINT(c.customer_lon, c.customer_lat)  -- Point to test
@@ -5,10 +5,13 @@ Generates realistic customer orders and geographic zones data for Bengaluru
 
 import pandas as pd
 import numpy as np
-import random
 from datetime import datetime, timedelta
+from itertools import chain
 from dotenv import load_dotenv
+import argparse
+import math
 import os
+import tempfile
 from firebolt.db import connect
 from firebolt.client.auth import ClientCredentials
 
@@ -34,7 +37,7 @@ def get_connection():
         print(f"Connection error: {e}")
         return None
 
-def generate_customer_orders(num_orders=50000):
+def generate_customer_orders(num_orders=50000, seed=42, first_order_id=1):
     """Generate sample customer orders data for Bengaluru"""
     
     # Bengaluru coordinate bounds
@@ -57,50 +60,64 @@ def generate_customer_orders(num_orders=50000):
     
     print(f"🏪 Generating {num_orders:,} customer orders...")
     
-    orders = []
     base_date = datetime.now() - timedelta(days=90)
+    # Seed from the id offset too, so top-up runs don't repeat earlier rows
+    rng = np.random.default_rng([seed, first_order_id])
     
-    for i in range(num_orders):
-        store = random.choice(stores)
-        
-        # Generate customer location near store (with some spread)
-        lat_offset = np.random.normal(0, 0.02)  # ~2km radius
-        lon_offset = np.random.normal(0, 0.02)
-        
-        customer_lat = max(bengaluru_bounds['lat_min'], 
-                          min(bengaluru_bounds['lat_max'], 
-                              store['lat'] + lat_offset))
-        customer_lon = max(bengaluru_bounds['lon_min'], 
-                          min(bengaluru_bounds['lon_max'], 
-                              store['lon'] + lon_offset))
-        
-        # Generate order details
-        order_value = round(np.random.exponential(500) + 50, 2)  # Exponential distribution
-        order_date = base_date + timedelta(days=random.randint(0, 90))
-        
-        # Generate realistic delivery time based on distance to store
-        distance_factor = np.sqrt(lat_offset**2 + lon_offset**2)  # Approximate distance
-        base_delivery_time = 20  # Base delivery time in minutes
-        distance_delivery_time = distance_factor * 1000  # Distance-based time
-        delivery_time = int(base_delivery_time + distance_delivery_time + np.random.normal(0, 5))
-        delivery_time = max(10, min(90, delivery_time))  # Clamp between 10-90 minutes
-        
-        orders.append({
-            'order_id': f'ORD_{i+1:06d}',
-            'customer_lat': round(customer_lat, 6),
-            'customer_lon': round(customer_lon, 6),
-            'order_value': order_value,
-            'order_date': order_date.strftime('%Y-%m-%d'),
-            'store_id': store['id'],
-            'store_lat': store['lat'],
-            'store_lon': store['lon'],
-            'delivery_time_minutes': delivery_time
-        })
-        
-        if (i + 1) % 10000 == 0:
-            print(f"   Generated {i+1:,} orders...")
+    # Store attributes as arrays so each order can index into them
+    store_ids = np.array([store['id'] for store in stores])
+    store_lats = np.array([store['lat'] for store in stores])
+    store_lons = np.array([store['lon'] for store in stores])
+    store_idx = rng.integers(0, len(stores), num_orders)
+    
+    # Generate customer locations near their store (with some spread)
+    lat_offsets = rng.normal(0, 0.02, num_orders)  # ~2km radius
+    lon_offsets = rng.normal(0, 0.02, num_orders)
+    
+    customer_lats = np.clip(store_lats[store_idx] + lat_offsets,
+                            bengaluru_bounds['lat_min'], bengaluru_bounds['lat_max'])
+    customer_lons = np.clip(store_lons[store_idx] + lon_offsets,
+                            bengaluru_bounds['lon_min'], bengaluru_bounds['lon_max'])
+    
+    # Generate order details
+    order_values = np.round(rng.exponential(500, num_orders) + 50, 2)  # Exponential distribution
+    order_days = rng.integers(0, 91, num_orders).astype('timedelta64[D]')
+    order_dates = np.datetime_as_string(np.datetime64(base_date.date()) + order_days, unit='D')
+    
+    # Generate realistic delivery time based on distance to store
+    distance_factors = np.hypot(lat_offsets, lon_offsets)  # Approximate distance
+    base_delivery_time = 20  # Base delivery time in minutes
+    distance_delivery_times = distance_factors * 1000  # Distance-based time
+    delivery_times = np.clip(
+        (base_delivery_time + distance_delivery_times + rng.normal(0, 5, num_orders)).astype(int),
+        10, 90  # Clamp between 10-90 minutes
+    )
     
-    return pd.DataFrame(orders)
+    # Zero-padded order ids, continuing from first_order_id
+    order_numbers = np.arange(first_order_id, first_order_id + num_orders)
+    order_ids = np.char.add("ORD_", np.char.zfill(order_numbers.astype(str), 6))
+    
+    return pd.DataFrame({
+        'order_id': order_ids,
+        'customer_lat': np.round(customer_lats, 6),
+        'customer_lon': np.round(customer_lons, 6),
+        'order_value': order_values,
+        'order_date': order_dates,
+        'store_id': store_ids[store_idx],
+        'store_lat': store_lats[store_idx],
+        'store_lon': store_lons[store_idx],
+        'delivery_time_minutes': delivery_times
+    })
+
+def zone_polygon_wkt(center_lat, center_lon, radius_km, num_points=32):
+    """Approximate a circular zone as a closed WKT polygon (counter-clockwise ring)"""
+    angles = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
+    lats = center_lat + (radius_km / 111.32) * np.sin(angles)
+    lons = center_lon + (radius_km / (111.32 * math.cos(math.radians(center_lat)))) * np.cos(angles)
+    
+    ring = [f"{lon:.6f} {lat:.6f}" for lat, lon in zip(lats, lons)]
+    ring.append(ring[0])  # Close the ring
+    return f"POLYGON(({', '.join(ring)}))"
 
 def generate_geo_zones():
     """Generate sample geographic zones for Bengaluru"""
@@ -142,6 +159,11 @@ def generate_geo_zones():
     ]
     
     print(f"🗺️ Generating {len(zones)} geographic zones...")
+    
+    # Zone boundaries for polygon containment queries
+    for zone in zones:
+        zone['polygon_wkt'] = zone_polygon_wkt(zone['zone_lat'], zone['zone_lon'], zone['zone_radius'])
+    
     return pd.DataFrame(zones)
 
 def create_tables_if_not_exist(connection):
@@ -168,7 +190,8 @@ def create_tables_if_not_exist(connection):
         zone_type TEXT,
         zone_lat DOUBLE PRECISION,
         zone_lon DOUBLE PRECISION,
-        zone_radius DOUBLE PRECISION
+        zone_radius DOUBLE PRECISION,
+        polygon_wkt TEXT
     ) PRIMARY INDEX zone_id
     """
     
@@ -193,30 +216,20 @@ def insert_data_batch(connection, table_name, df, batch_size=1000):
     cursor = connection.cursor()
     total_rows = len(df)
     
+    # Multi-row VALUES template with ? placeholders; the driver handles quoting
+    row_template = "(" + ", ".join("?" * len(df.columns)) + ")"
+    
     print(f"📤 Inserting {total_rows:,} rows into {table_name}...")
     
     for i in range(0, total_rows, batch_size):
         batch = df.iloc[i:i+batch_size]
         
-        if table_name == 'customer_orders':
-            values = []
-            for _, row in batch.iterrows():
-                values.append(f"('{row['order_id']}', {row['customer_lat']}, {row['customer_lon']}, "
-                            f"{row['order_value']}, '{row['order_date']}', '{row['store_id']}', "
-                            f"{row['store_lat']}, {row['store_lon']}, {row['delivery_time_minutes']})")
-            
-            sql = f"INSERT INTO customer_orders VALUES " + ", ".join(values)
-            
-        elif table_name == 'geo_zones':
-            values = []
-            for _, row in batch.iterrows():
-                values.append(f"('{row['zone_id']}', '{row['zone_name']}', '{row['zone_type']}', "
-                            f"{row['zone_lat']}, {row['zone_lon']}, {row['zone_radius']})")
-            
-            sql = f"INSERT INTO geo_zones VALUES " + ", ".join(values)
+        # One statement per batch rather than one per row
+        sql = f"INSERT INTO {table_name} VALUES " + ", ".join([row_template] * len(batch))
+        params = list(chain.from_iterable(batch.itertuples(index=False, name=None)))
         
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             print(f"   Inserted batch {i//batch_size + 1} ({min(i+batch_size, total_rows):,}/{total_rows:,} rows)")
         
         except Exception as e:
@@ -225,27 +238,148 @@ def insert_data_batch(connection, table_name, df, batch_size=1000):
     
     cursor.close()
 
-def check_existing_data(connection):
-    """Check if data already exists in tables"""
-    cursor = connection.cursor()
+def bulk_load(connection, table_name, df):
+    """Load a table with a single COPY from a parquet file staged on S3"""
+    
+    bucket = os.getenv("BULK_LOAD_S3_BUCKET")
+    if not bucket:
+        print("   ⚠️ BULK_LOAD_S3_BUCKET is not set, falling back to batched inserts")
+        return False
     
     try:
-        cursor.execute("SELECT COUNT(*) FROM customer_orders")
-        orders_count = cursor.fetchone()[0]
+        # Optional: only needed for bulk loading
+        import boto3
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        print(f"   ⚠️ {e.name} is not installed, falling back to batched inserts")
+        return False
+    
+    prefix = os.getenv("BULK_LOAD_S3_PREFIX", "firebolt-geospatial-demo")
+    key = f"{prefix}/{table_name}.parquet"
+    fd, local_path = tempfile.mkstemp(prefix=f"{table_name}_", suffix=".parquet")
+    os.close(fd)
+    
+    print(f"📦 Bulk loading {len(df):,} rows into {table_name} via s3://{bucket}/{key}...")
+    
+    cursor = connection.cursor()
+    try:
+        # Write the columns through Arrow, narrowing integers to the table's 32-bit INT
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.cast(pa.schema([
+            pa.field(field.name, pa.int32()) if pa.types.is_integer(field.type) else field
+            for field in table.schema
+        ]))
+        pq.write_table(table, local_path, compression='zstd')
+        boto3.client("s3").upload_file(local_path, bucket, key)
         
-        cursor.execute("SELECT COUNT(*) FROM geo_zones") 
-        zones_count = cursor.fetchone()[0]
+        # Pass AWS keys as bound parameters, and only when both are set
+        copy_sql = f"COPY INTO {table_name} FROM 's3://{bucket}/{key}' WITH TYPE = PARQUET"
+        copy_params = None
+        key_id, secret_key = os.getenv("AWS_ACCESS_KEY_ID"), os.getenv("AWS_SECRET_ACCESS_KEY")
+        if key_id and secret_key:
+            copy_sql += " CREDENTIALS = (AWS_KEY_ID = ? AWS_SECRET_KEY = ?)"
+            copy_params = (key_id, secret_key)
         
+        cursor.execute(copy_sql, copy_params)
+        print(f"   ✅ Loaded {len(df):,} rows into {table_name}")
+        return True
+    
+    except Exception as e:
+        print(f"   ❌ Bulk load failed, falling back to batched inserts: {e}")
+        return False
+    
+    finally:
+        cursor.close()
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+def load_table(connection, table_name, df):
+    """Bulk load when BULK_LOAD=1 is set, otherwise insert in batches"""
+    if os.getenv("BULK_LOAD") == "1" and bulk_load(connection, table_name, df):
+        return
+    insert_data_batch(connection, table_name, df)
+
+def zones_have_polygons(connection):
+    """Check whether geo_zones has the polygon_wkt column added for ST_Contains"""
+    cursor = connection.cursor()
+    
+    try:
+        cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'geo_zones' AND column_name = 'polygon_wkt'
+        """)
+        return cursor.fetchone()[0] > 0
+    
+    except Exception as e:
+        # Don't drop a table on an inconclusive check
+        print(f"❌ Error checking geo_zones columns: {e}")
+        return True
+    
+    finally:
+        cursor.close()
+
+def reset_geo_zones(connection):
+    """Drop geo_zones so it is recreated with the current schema"""
+    cursor = connection.cursor()
+    print("🔄 Dropping geo_zones to rebuild it with zone polygons...")
+    
+    try:
+        cursor.execute("DROP TABLE IF EXISTS geo_zones")
+    
+    finally:
         cursor.close()
-        return orders_count, zones_count
+
+def count_rows(connection, table_name):
+    """Count a table's rows, 0 if the table does not exist yet, None if the check failed"""
+    cursor = connection.cursor()
+    
+    try:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?",
+            (table_name,)
+        )
+        if cursor.fetchone()[0] == 0:
+            return 0
         
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        return cursor.fetchone()[0]
+    
     except Exception as e:
-        print(f"❌ Error checking existing data: {e}")
+        print(f"❌ Error checking existing {table_name} data: {e}")
+        return None
+    
+    finally:
+        cursor.close()
+
+def check_existing_data(connection):
+    """Check if data already exists in tables"""
+    return count_rows(connection, 'customer_orders'), count_rows(connection, 'geo_zones')
+
+def existing_zone_ids(connection):
+    """Get the zone_ids already loaded into geo_zones, None if the lookup failed"""
+    cursor = connection.cursor()
+    
+    try:
+        cursor.execute("SELECT zone_id FROM geo_zones")
+        return {row[0] for row in cursor.fetchall()}
+    
+    except Exception as e:
+        print(f"❌ Error reading existing zone ids: {e}")
+        return None
+    
+    finally:
         cursor.close()
-        return 0, 0
 
 def main():
     """Main data generation function"""
+    parser = argparse.ArgumentParser(description="Generate sample data for the Firebolt geospatial demo")
+    parser.add_argument("--rows", type=int, default=50000,
+                        help="target number of customer orders (default: 50000)")
+    parser.add_argument("--reset-zones", action="store_true",
+                        help="drop and regenerate geo_zones")
+    args = parser.parse_args()
+    
     print("🚀 Firebolt Geospatial Demo - Sample Data Generator")
     print("=" * 60)
     
@@ -260,36 +394,63 @@ def main():
     # Check existing data
     orders_count, zones_count = check_existing_data(connection)
     
+    # Topping up from unknown counts would duplicate rows and order ids
+    if orders_count is None or zones_count is None:
+        print("❌ Could not read existing data counts, aborting without changes.")
+        connection.close()
+        return
+    
     if orders_count > 0 or zones_count > 0:
         print(f"📊 Existing data found:")
         print(f"   customer_orders: {orders_count:,} rows")
         print(f"   geo_zones: {zones_count:,} rows")
-        
-        response = input("\n🤔 Do you want to add more sample data? (y/n): ").lower()
-        if response != 'y':
-            print("⏭️ Skipping data generation.")
+    
+    # geo_zones tables created before zone polygons lack polygon_wkt, and
+    # CREATE TABLE IF NOT EXISTS will not add it, so rebuild the (small) table
+    if args.reset_zones or (zones_count > 0 and not zones_have_polygons(connection)):
+        reset_geo_zones(connection)
+        zones_count = 0
+    
+    # Only generate what is missing from the requested totals
+    needed_orders = max(0, args.rows - orders_count)
+    zones_df = generate_geo_zones()
+    if zones_count > 0:
+        loaded_zone_ids = existing_zone_ids(connection)
+        if loaded_zone_ids is None:
+            print("❌ Could not read existing zones, aborting without changes.")
             connection.close()
             return
+        zones_df = zones_df[~zones_df['zone_id'].isin(loaded_zone_ids)]
+    needs_zones = not zones_df.empty
+    
+    if needed_orders == 0 and not needs_zones:
+        print(f"⏭️ Already have {args.rows:,} orders and all zones, skipping data generation.")
+        connection.close()
+        return
     
     # Create tables
     create_tables_if_not_exist(connection)
     
-    # Generate and insert customer orders
-    orders_df = generate_customer_orders(50000)
-    insert_data_batch(connection, 'customer_orders', orders_df)
+    # Generate and insert customer orders, continuing the existing order ids
+    if needed_orders > 0:
+        orders_df = generate_customer_orders(needed_orders, first_order_id=orders_count + 1)
+        load_table(connection, 'customer_orders', orders_df)
     
-    # Generate and insert geo zones  
-    zones_df = generate_geo_zones()
-    insert_data_batch(connection, 'geo_zones', zones_df)
+    # Insert only the geo zones that are not loaded yet
+    if needs_zones:
+        insert_data_batch(connection, 'geo_zones', zones_df)
     
     # Verify data
     final_orders, final_zones = check_existing_data(connection)
     
     print("\n" + "=" * 60)
     print("🎉 Sample data generation complete!")
-    print(f"📊 Final data counts:")
-    print(f"   customer_orders: {final_orders:,} rows")
-    print(f"   geo_zones: {final_zones:,} rows")
+    if final_orders is None or final_zones is None:
+        print("⚠️ Could not verify the final data counts")
+    else:
+        print(f"📊 Final data counts:")
+        print(f"   customer_orders: {final_orders:,} rows")
+        print(f"   geo_zones: {final_zones:,} rows")
     print("\n🚀 You can now run the demo with: streamlit run app_geospatial_demo.py")
     
     connection.close()